@@ -3,11 +3,23 @@ import os
 from werkzeug.utils import secure_filename
 from config import Config
 from database import db
+from rate_limit import RateLimiter, MemoryBucketStore, MongoBucketStore
 import io
 
 app = Flask(__name__)
 app.secret_key = Config.SECRET_KEY
 
+if Config.RATE_LIMIT_STORE == 'mongo':
+    limiter = RateLimiter(MongoBucketStore(db.rate_limits))
+else:
+    limiter = RateLimiter(MemoryBucketStore())
+
+def rate_limited(route, rate, capacity, max_concurrent, applies):
+    """Apply the limiter to a view unless rate limiting is disabled"""
+    if not Config.RATE_LIMIT_ENABLED:
+        return lambda view: view
+    return limiter.limit(route, rate, capacity, max_concurrent, applies)
+
 @app.route('/')
 def login():
     return render_template('login.html')
@@ -56,6 +68,8 @@ def signup():
     return render_template('signup.html')
 
 @app.route('/home', methods=['GET', 'POST'])
+@rate_limited('search', Config.SEARCH_RATE, Config.SEARCH_BURST, Config.MAX_CONCURRENT_SEARCHES,
+              applies=lambda: bool(request.args.get('search')))
 def home():
     if 'username' not in session:
         return redirect(url_for('login'))
@@ -83,14 +97,22 @@ def home():
     # Convert users list to dict for template compatibility
     users_dict = {user['username']: user for user in all_users}
     
-    # Get likes and comments for all media
+    # Get likes and the latest page of comments for all media; "older
+    # comments" links page one file back with ?comments_for=&comments_before=
+    comments_for = request.args.get('comments_for')
+    comments_before = request.args.get('comments_before')
     likes_data = {}
     comments_data = {}
+    older_comments = {}
     
     for media in filtered_media:
         file_id = media['file_id']
         likes_data[file_id] = db.get_likes_for_file(file_id)
-        comments_data[file_id] = db.get_comments_for_file(file_id)
+        before = comments_before if file_id == comments_for else None
+        comments_data[file_id] = db.get_comments_for_file(file_id, before=before,
+                                                          has_archive=media.get('comments_archived', False))
+        if len(comments_data[file_id]) >= Config.COMMENT_PAGE_SIZE:
+            older_comments[file_id] = str(comments_data[file_id][0]['_id'])
 
     return render_template('home.html',
                            username=current_user,
@@ -98,7 +120,8 @@ def home():
                            matched_users=matched_users,
                            users=users_dict,
                            likes=likes_data,
-                           comments=comments_data)
+                           comments=comments_data,
+                           older_comments=older_comments)
 
 @app.route('/like/<file_id>', methods=['POST'])
 def like(file_id):
@@ -121,6 +144,8 @@ def comment(file_id):
     return redirect(url_for('home'))
 
 @app.route('/post', methods=['GET', 'POST'])
+@rate_limited('upload', Config.UPLOAD_RATE, Config.UPLOAD_BURST, Config.MAX_CONCURRENT_UPLOADS,
+              applies=lambda: request.method == 'POST')
 def post():
     if 'username' not in session:
         return redirect(url_for('login'))
@@ -166,13 +191,19 @@ def charts():
 
     sender = session['username']
     receiver = request.args.get('receiver')
+    before = request.args.get('before')
     messages = []
+    older_before = None
     receiver_pic_filename = None
     receiver_pic_id = None
 
     if receiver:
-        # Get chat messages
-        messages = db.get_chat_messages(sender, receiver)
+        # Get the latest page of chat messages; scrolling back passes the
+        # oldest ID shown as ?before=
+        messages = db.get_chat_messages(sender, receiver, before=before)
+        if len(messages) >= Config.CHAT_PAGE_SIZE:
+            older_before = str(messages[0]['_id'])
+        db.mark_inbox_read(sender, receiver)
         
         # Get receiver's profile pic
         receiver_user = db.get_user(receiver)
@@ -185,17 +216,21 @@ def charts():
             db.add_chat_message(sender, receiver, text)
             return redirect(url_for('charts', receiver=receiver))
 
-    # Get all users for the user list
-    all_users = db.get_all_users()
-    users_dict = {user['username']: user for user in all_users}
+    # Recent conversations with unread counts for the sidebar, plus the
+    # profile pics of just those users
+    inbox = db.get_inbox(sender)
+    counterparts = [entry['counterpart'] for entry in inbox]
+    users_dict = {user['username']: user for user in db.get_users_by_names(counterparts)}
 
     return render_template('charts.html',
                            users=users_dict,
+                           inbox=inbox,
                            current_user=sender,
                            receiver=receiver,
                            receiver_pic_filename=receiver_pic_filename,
                            receiver_pic_id=receiver_pic_id,
-                           messages=messages)
+                           messages=messages,
+                           older_before=older_before)
 
 @app.route('/logout', methods=['POST'])
 def logout():
@@ -208,6 +243,9 @@ def serve_file(file_id):
     try:
         file_obj = db.get_file(file_id)
         if file_obj:
+            # Count views of posted media, not profile pics
+            if (file_obj.metadata or {}).get('kind') == 'media':
+                db.record_view(file_id)
             return send_file(
                 io.BytesIO(file_obj.read()),
                 mimetype=file_obj.content_type or 'application/octet-stream'
@@ -0,0 +1,28 @@
+import zlib
+import bson
+from config import Config
+
+try:
+    import zstandard
+except ImportError:
+    # Fall back to zlib if zstandard is not installed
+    zstandard = None
+
+def pack_documents(documents):
+    """Compress a list of documents, returning (codec, data, uncompressed size)"""
+    raw = bson.encode({'docs': documents})
+    if zstandard:
+        return 'zstd', zstandard.ZstdCompressor(level=Config.ARCHIVE_ZSTD_LEVEL).compress(raw), len(raw)
+    return 'zlib', zlib.compress(raw, 6), len(raw)
+
+def unpack_documents(codec, data):
+    """Decompress documents packed by pack_documents()"""
+    if codec == 'zstd':
+        if not zstandard:
+            raise RuntimeError("zstandard is required to read this archive")
+        raw = zstandard.ZstdDecompressor().decompress(data)
+    elif codec == 'zlib':
+        raw = zlib.decompress(data)
+    else:
+        raise ValueError(f"Unknown archive codec: {codec}")
+    return bson.decode(raw)['docs']
@@ -19,4 +19,39 @@ class Config:
     USERS_COLLECTION = 'users'
     CHATS_COLLECTION = 'chats'
     LIKES_COLLECTION = 'likes'
-    COMMENTS_COLLECTION = 'comments' 
\ No newline at end of file
+    COMMENTS_COLLECTION = 'comments' 
+    VIEWS_COLLECTION = 'views'
+    RATE_LIMITS_COLLECTION = 'rate_limits'
+    INBOX_COLLECTION = 'inbox'
+    CHATS_ARCHIVE_COLLECTION = 'chats_archive'
+    COMMENTS_ARCHIVE_COLLECTION = 'comments_archive'
+
+    # Write-behind buffering for likes and view counts
+    WRITE_BEHIND_ENABLED = os.getenv('WRITE_BEHIND_ENABLED', 'false').lower() == 'true'
+    WRITE_BEHIND_FLUSH_INTERVAL = float(os.getenv('WRITE_BEHIND_FLUSH_INTERVAL', '0.25'))  # seconds
+    WRITE_BEHIND_MAX_PENDING = int(os.getenv('WRITE_BEHIND_MAX_PENDING', '1000'))  # most keys lost on a crash
+
+    # Rate limiting for expensive routes (rate in requests/second, burst in requests)
+    RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+    RATE_LIMIT_STORE = os.getenv('RATE_LIMIT_STORE', 'memory')  # 'memory' or 'mongo' for multi-worker
+    SEARCH_RATE = float(os.getenv('SEARCH_RATE', '1'))
+    SEARCH_BURST = int(os.getenv('SEARCH_BURST', '10'))
+    UPLOAD_RATE = float(os.getenv('UPLOAD_RATE', '0.2'))
+    UPLOAD_BURST = int(os.getenv('UPLOAD_BURST', '5'))
+    MAX_CONCURRENT_SEARCHES = int(os.getenv('MAX_CONCURRENT_SEARCHES', '8'))  # per worker
+    MAX_CONCURRENT_UPLOADS = int(os.getenv('MAX_CONCURRENT_UPLOADS', '4'))  # per worker
+
+    # GridFS garbage collection (python maintenance.py gc)
+    GC_GRACE_PERIOD_HOURS = float(os.getenv('GC_GRACE_PERIOD_HOURS', '24'))
+    GC_BATCH_SIZE = int(os.getenv('GC_BATCH_SIZE', '500'))
+
+    # Chat inbox (python maintenance.py rebuild-inbox to backfill)
+    INBOX_PREVIEW_LENGTH = int(os.getenv('INBOX_PREVIEW_LENGTH', '100'))
+    INBOX_PAGE_SIZE = int(os.getenv('INBOX_PAGE_SIZE', '50'))
+
+    # Archival of old chats and comments (python maintenance.py archive)
+    ARCHIVE_AFTER_DAYS = float(os.getenv('ARCHIVE_AFTER_DAYS', '90'))
+    ARCHIVE_BATCH_SIZE = int(os.getenv('ARCHIVE_BATCH_SIZE', '200'))  # documents per archive document
+    ARCHIVE_ZSTD_LEVEL = int(os.getenv('ARCHIVE_ZSTD_LEVEL', '10'))
+    CHAT_PAGE_SIZE = int(os.getenv('CHAT_PAGE_SIZE', '50'))
+    COMMENT_PAGE_SIZE = int(os.getenv('COMMENT_PAGE_SIZE', '20'))
@@ -1,9 +1,12 @@
-from pymongo import MongoClient
+from pymongo import MongoClient, UpdateOne
 from gridfs import GridFS
 from config import Config
+from write_buffer import WriteBehindBuffer
+from archive import pack_documents, unpack_documents
 import os
 import io
-from bson import ObjectId
+from datetime import datetime, timedelta
+from bson import ObjectId, Binary
 
 class Database:
     def __init__(self):
@@ -15,6 +18,11 @@ class Database:
         self.chats = self.db[Config.CHATS_COLLECTION]
         self.likes = self.db[Config.LIKES_COLLECTION]
         self.comments = self.db[Config.COMMENTS_COLLECTION]
+        self.views = self.db[Config.VIEWS_COLLECTION]
+        self.rate_limits = self.db[Config.RATE_LIMITS_COLLECTION]
+        self.inbox = self.db[Config.INBOX_COLLECTION]
+        self.chats_archive = self.db[Config.CHATS_ARCHIVE_COLLECTION]
+        self.comments_archive = self.db[Config.COMMENTS_ARCHIVE_COLLECTION]
         
         # GridFS for file storage
         self.fs = GridFS(self.db)
@@ -22,17 +30,36 @@ class Database:
         # Create indexes for better performance
         self.users.create_index("username", unique=True)
         self.likes.create_index([("filename", 1), ("username", 1)])
+        self.likes.create_index([("file_id", 1), ("username", 1)])
         self.comments.create_index("filename")
         self.chats.create_index([("participants", 1)])
+        self.views.create_index("file_id", unique=True)
+        self.inbox.create_index([("owner", 1), ("counterpart", 1)], unique=True)
+        self.inbox.create_index([("owner", 1), ("last_ts", -1)])
+        self.chats.create_index([("conversation", 1), ("_id", -1)])
+        self.comments.create_index([("file_id", 1), ("_id", -1)])
+        self.chats_archive.create_index([("key", 1), ("last_id", -1)])
+        self.comments_archive.create_index([("key", 1), ("last_id", -1)])
+        
+        # Optional write-behind buffer for likes and views
+        self.write_buffer = None
+        if Config.WRITE_BEHIND_ENABLED:
+            self.write_buffer = WriteBehindBuffer(
+                self.likes,
+                self.views,
+                flush_interval=Config.WRITE_BEHIND_FLUSH_INTERVAL,
+                max_pending=Config.WRITE_BEHIND_MAX_PENDING
+            )
     
-    def store_file(self, file_data, filename, content_type=None):
+    def store_file(self, file_data, filename, content_type=None, metadata=None):
         """Store a file in GridFS"""
         try:
             # Store file in GridFS
             file_id = self.fs.put(
                 file_data,
                 filename=filename,
-                content_type=content_type
+                content_type=content_type,
+                metadata=metadata
             )
             return str(file_id)
         except Exception as e:
@@ -53,6 +80,8 @@ class Database:
     def delete_file(self, file_id):
         """Delete a file from GridFS"""
         try:
+            if isinstance(file_id, str):
+                file_id = ObjectId(file_id)
             self.fs.delete(file_id)
             return True
         except Exception as e:
@@ -78,6 +107,9 @@ class Database:
             return result.inserted_id
         except Exception as e:
             print(f"Error creating user: {e}")
+            # Don't leave the profile pic behind when the insert fails
+            if profile_pic_id:
+                self.delete_file(profile_pic_id)
             return None
     
     def get_user(self, username):
@@ -86,8 +118,8 @@ class Database:
     
     def update_user_media(self, username, media_type, file_data, filename, description):
         """Add media (image/video) to user's collection"""
-        # Store file in GridFS
-        file_id = self.store_file(file_data, filename)
+        # Store file in GridFS; the metadata lets serve_file() count views of media only
+        file_id = self.store_file(file_data, filename, metadata={'kind': 'media'})
         if not file_id:
             return False
         
@@ -113,6 +145,10 @@ class Database:
         """Get all users"""
         return list(self.users.find({}, {'password': 0}))  # Exclude password
     
+    def get_users_by_names(self, usernames):
+        """Get the given users"""
+        return list(self.users.find({'username': {'$in': list(usernames)}}, {'password': 0}))
+    
     def get_all_media(self):
         """Get all media from all users"""
         all_media = []
@@ -128,7 +164,8 @@ class Database:
                     'file_id': image['file_id'],
                     'filename': image['filename'],
                     'description': image['description'],
-                    'username': username
+                    'username': username,
+                    'comments_archived': image.get('comments_archived', False)
                 })
             
             # Add videos
@@ -138,13 +175,17 @@ class Database:
                     'file_id': video['file_id'],
                     'filename': video['filename'],
                     'description': video['description'],
-                    'username': username
+                    'username': username,
+                    'comments_archived': video.get('comments_archived', False)
                 })
         
         return all_media
     
     def toggle_like(self, file_id, username):
         """Toggle like for a file"""
+        if self.write_buffer:
+            return self.write_buffer.toggle_like(file_id, username)
+        
         existing_like = self.likes.find_one({
             'file_id': file_id,
             'username': username
@@ -167,12 +208,40 @@ class Database:
     
     def get_likes_count(self, file_id):
         """Get number of likes for a file"""
+        if self.write_buffer:
+            return len(self.get_likes_for_file(file_id))
         return self.likes.count_documents({'file_id': file_id})
     
     def get_likes_for_file(self, file_id):
         """Get all usernames who liked a file"""
         likes = self.likes.find({'file_id': file_id})
-        return [like['username'] for like in likes]
+        usernames = [like['username'] for like in likes]
+        if self.write_buffer:
+            # Overlay toggles that have not been flushed yet
+            pending = self.write_buffer.pending_likes_for_file(file_id)
+            usernames = [u for u in usernames if pending.get(u, True)]
+            usernames += [u for u, liked in pending.items() if liked and u not in usernames]
+        return usernames
+    
+    def record_view(self, file_id):
+        """Count a view of a file (only with the write-behind buffer enabled)"""
+        # Views come from the busiest read path, so they are never written
+        # one at a time
+        if self.write_buffer:
+            self.write_buffer.record_view(file_id)
+    
+    def get_views_count(self, file_id):
+        """Get number of views for a file"""
+        doc = self.views.find_one({'file_id': file_id})
+        count = doc['count'] if doc else 0
+        if self.write_buffer:
+            count += self.write_buffer.pending_views_for_file(file_id)
+        return count
+    
+    def flush_writes(self):
+        """Flush buffered likes and views (no-op without the write-behind buffer)"""
+        if self.write_buffer:
+            self.write_buffer.flush()
     
     def add_comment(self, file_id, username, comment_text):
         """Add a comment to a file"""
@@ -184,28 +253,222 @@ class Database:
         }
         return self.comments.insert_one(comment_data)
     
-    def get_comments_for_file(self, file_id):
-        """Get all comments for a file"""
-        comments = self.comments.find({'file_id': file_id}).sort('timestamp', 1)
-        return list(comments)
+    def get_comments_for_file(self, file_id, before=None, limit=None, has_archive=False):
+        """Get a page of comments for a file, oldest first
+        
+        Returns the newest `limit` (default COMMENT_PAGE_SIZE) comments older
+        than the comment ID `before`. The archive is read once the hot ones
+        run out, but only when paging back or when has_archive is set (the
+        media item's comments_archived flag).
+        """
+        limit = limit or Config.COMMENT_PAGE_SIZE
+        return self._read_page(self.comments, self.comments_archive, 'file_id', file_id, before, limit, has_archive)
+    
+    def _conversation_key(self, user1, user2):
+        """Scalar key for a conversation, e.g. '5:alice|bob'
+        
+        participants is an array, so indexes on it are multikey and can't
+        serve a page read for one conversation. The length prefix keeps
+        usernames containing '|' from colliding.
+        """
+        first, second = sorted([user1, user2])
+        return f"{len(first)}:{first}|{second}"
     
     def add_chat_message(self, sender, receiver, message):
         """Add a chat message"""
         participants = sorted([sender, receiver])
         chat_data = {
             'participants': participants,
+            'conversation': self._conversation_key(sender, receiver),
             'from': sender,
             'to': receiver,
             'text': message,
             'timestamp': os.urandom(8).hex()
         }
-        return self.chats.insert_one(chat_data)
+        result = self.chats.insert_one(chat_data)
+        self._update_inbox(sender, receiver, message)
+        return result
     
-    def get_chat_messages(self, user1, user2):
-        """Get chat messages between two users"""
-        participants = sorted([user1, user2])
-        messages = self.chats.find({'participants': participants}).sort('timestamp', 1)
-        return list(messages)
+    def _inbox_latest(self, message, sender, timestamp):
+        """Pipeline $set fields that replace an inbox preview only if it is older"""
+        # Guarding on last_ts means concurrent sends that land out of order
+        # can't leave an earlier message on top
+        is_newer = {'$lt': ['$last_ts', timestamp]}
+        return {
+            'last_text': {'$cond': [is_newer, {'$literal': message[:Config.INBOX_PREVIEW_LENGTH]}, '$last_text']},
+            'last_from': {'$cond': [is_newer, {'$literal': sender}, '$last_from']},
+            'last_ts': {'$cond': [is_newer, timestamp, '$last_ts']}
+        }
+    
+    def _update_inbox(self, sender, receiver, message):
+        """Record the latest message in both participants' inboxes"""
+        latest = self._inbox_latest(message, sender, datetime.utcnow())
+        operations = [
+            UpdateOne(
+                {'owner': sender, 'counterpart': receiver},
+                [{'$set': dict(latest, unread={'$ifNull': ['$unread', 0]})}],
+                upsert=True
+            )
+        ]
+        if receiver != sender:
+            operations.append(UpdateOne(
+                {'owner': receiver, 'counterpart': sender},
+                [{'$set': dict(latest, unread={'$add': [{'$ifNull': ['$unread', 0]}, 1]})}],
+                upsert=True
+            ))
+        try:
+            self.inbox.bulk_write(operations, ordered=False)
+        except Exception as e:
+            # The message itself is saved; rebuild_inbox() can repair the inbox
+            print(f"Error updating inbox: {e}")
+    
+    def get_chat_messages(self, user1, user2, before=None, limit=None):
+        """Get a page of chat messages between two users, oldest first
+        
+        Returns the newest `limit` (default CHAT_PAGE_SIZE) messages older
+        than the message ID `before`. The archive is read once the hot ones
+        run out, but only when paging back or when the conversation is
+        flagged as archived in the inbox.
+        """
+        conversation = self._conversation_key(user1, user2)
+        limit = limit or Config.CHAT_PAGE_SIZE
+        return self._read_page(self.chats, self.chats_archive, 'conversation', conversation, before, limit,
+                               lambda: self.conversation_archived(user1, user2))
+    
+    def conversation_archived(self, user1, user2):
+        """Whether any of a conversation's messages have been archived"""
+        entry = self.inbox.find_one({'owner': user1, 'counterpart': user2}, {'archived': 1})
+        return bool(entry and entry.get('archived'))
+    
+    def _read_page(self, hot, archive, key_field, key, before, limit, has_archive=False):
+        """Read the `limit` newest documents older than `before`, oldest first
+        
+        has_archive is a bool, or a callable so the check is only made when
+        the hot page comes up short.
+        """
+        query = {key_field: key}
+        if before:
+            if not ObjectId.is_valid(before):
+                # A malformed cursor from the client; start from the newest
+                print(f"Ignoring invalid page cursor: {before}")
+            else:
+                query['_id'] = {'$lt': ObjectId(before)}
+        page = list(hot.find(query).sort('_id', -1).limit(limit))
+        
+        paging_back = '_id' in query
+        if len(page) < limit and not paging_back and callable(has_archive):
+            has_archive = has_archive()
+        if len(page) < limit and (paging_back or has_archive):
+            # Scrolled past the hot window; continue from the archive
+            boundary = page[-1]['_id'] if page else query.get('_id', {}).get('$lt')
+            seen = {doc['_id'] for doc in page}
+            archive_query = {'key': key}
+            if boundary:
+                archive_query['first_id'] = {'$lt': boundary}
+            for packed in archive.find(archive_query).sort('last_id', -1):
+                documents = unpack_documents(packed['codec'], packed['data'])
+                for doc in reversed(documents):
+                    # A document may be in both tiers if archiving was interrupted
+                    if (boundary and doc['_id'] >= boundary) or doc['_id'] in seen:
+                        continue
+                    seen.add(doc['_id'])
+                    page.append(doc)
+                    if len(page) >= limit:
+                        break
+                if len(page) >= limit:
+                    break
+        
+        page.reverse()
+        return page
+    
+    def get_inbox(self, owner, limit=None):
+        """Get a user's conversations, most recent first"""
+        limit = limit or Config.INBOX_PAGE_SIZE
+        entries = self.inbox.find({'owner': owner}, {'_id': 0}).sort('last_ts', -1).limit(limit)
+        return list(entries)
+    
+    def mark_inbox_read(self, owner, counterpart):
+        """Clear the unread count for one conversation"""
+        self.inbox.update_one(
+            {'owner': owner, 'counterpart': counterpart, 'unread': {'$gt': 0}},
+            {'$set': {'unread': 0}}
+        )
+    
+    def _rebuild_inbox_from_archive(self):
+        """Backfill inbox entries from the newest archived batch of each conversation"""
+        newest_batches = self.chats_archive.aggregate([
+            {'$sort': {'last_id': -1}},
+            {'$group': {'_id': '$key', 'batch_id': {'$first': '$_id'}}}
+        ], allowDiskUse=True)
+        
+        operations = []
+        for group in newest_batches:
+            packed = self.chats_archive.find_one({'_id': group['batch_id']})
+            last = unpack_documents(packed['codec'], packed['data'])[-1]
+            latest = self._inbox_latest(last['text'], last['from'], last['_id'].generation_time)
+            for owner, counterpart in {tuple(last['participants']), tuple(reversed(last['participants']))}:
+                operations.append(UpdateOne(
+                    {'owner': owner, 'counterpart': counterpart},
+                    [{'$set': dict(latest, unread={'$ifNull': ['$unread', 0]}, archived=True)}],
+                    upsert=True
+                ))
+            if len(operations) >= Config.ARCHIVE_BATCH_SIZE:
+                self.inbox.bulk_write(operations, ordered=False)
+                operations = []
+        if operations:
+            self.inbox.bulk_write(operations, ordered=False)
+    
+    def rebuild_inbox(self):
+        """Backfill the inbox from the chats and chats_archive collections
+        
+        Existing unread counts are kept; new entries start with none unread.
+        The message time is taken from the chat's ObjectId.
+        """
+        # Archived messages are always older than hot ones, so the hot pass
+        # below overwrites these for conversations that have both
+        self._rebuild_inbox_from_archive()
+        
+        self.chats.aggregate([
+            {'$sort': {'_id': 1}},
+            {'$group': {
+                '_id': '$participants',
+                'last_text': {'$last': '$text'},
+                'last_from': {'$last': '$from'},
+                'last_id': {'$last': '$_id'}
+            }},
+            # One inbox entry per participant
+            {'$project': {
+                'last_text': 1,
+                'last_from': 1,
+                'last_id': 1,
+                'sides': [
+                    {'owner': {'$arrayElemAt': ['$_id', 0]}, 'counterpart': {'$arrayElemAt': ['$_id', 1]}},
+                    {'owner': {'$arrayElemAt': ['$_id', 1]}, 'counterpart': {'$arrayElemAt': ['$_id', 0]}}
+                ]
+            }},
+            {'$unwind': '$sides'},
+            {'$project': {
+                '_id': 0,
+                'owner': '$sides.owner',
+                'counterpart': '$sides.counterpart',
+                'last_text': {'$substrCP': ['$last_text', 0, Config.INBOX_PREVIEW_LENGTH]},
+                'last_from': 1,
+                'last_ts': {'$toDate': '$last_id'},
+                'unread': {'$literal': 0}
+            }},
+            {'$merge': {
+                'into': Config.INBOX_COLLECTION,
+                'on': ['owner', 'counterpart'],
+                # Like _inbox_latest(), never replace a newer preview, e.g. one
+                # from a message sent while the rebuild was running
+                'whenMatched': [{'$set': {
+                    field: {'$cond': [{'$lt': ['$last_ts', '$$new.last_ts']}, f'$$new.{field}', f'${field}']}
+                    for field in ('last_text', 'last_from', 'last_ts')
+                }}],
+                'whenNotMatched': 'insert'
+            }}
+        ], allowDiskUse=True)
+        return self.inbox.count_documents({})
     
     def search_users(self, search_term):
         """Search users by username"""
@@ -227,6 +490,262 @@ class Database:
                 filtered_media.append(media)
         
         return filtered_media
+    
+    def _referenced_file_ids(self, batch_size):
+        """Mark phase: collect every GridFS file ID still referenced"""
+        referenced = set()
+        
+        users = self.users.find({}, {'profile_pic_id': 1, 'images.file_id': 1, 'videos.file_id': 1})
+        for user in users.batch_size(batch_size):
+            if user.get('profile_pic_id'):
+                referenced.add(str(user['profile_pic_id']))
+            for media in user.get('images', []) + user.get('videos', []):
+                if media.get('file_id'):
+                    referenced.add(str(media['file_id']))
+        
+        for group in self.comments.aggregate([{'$group': {'_id': '$file_id'}}], batchSize=batch_size):
+            if group['_id']:
+                referenced.add(str(group['_id']))
+        
+        # Archived comments are packed per file, keyed by file_id
+        for group in self.comments_archive.aggregate([{'$group': {'_id': '$key'}}], batchSize=batch_size):
+            if group['_id']:
+                referenced.add(str(group['_id']))
+        
+        return referenced
+    
+    def _sweep_files(self, file_ids, dry_run):
+        if file_ids and not dry_run:
+            # Remove fs.files first so readers see "not found" rather than a partial file
+            self.db['fs.files'].delete_many({'_id': {'$in': file_ids}})
+            self.db['fs.chunks'].delete_many({'files_id': {'$in': file_ids}})
+    
+    def _sweep_orphan_chunks(self, files_ids, dry_run, report):
+        if not files_ids:
+            return
+        sizes = self.db['fs.chunks'].aggregate([
+            {'$match': {'files_id': {'$in': files_ids}}},
+            {'$group': {'_id': None, 'bytes': {'$sum': {'$binarySize': '$data'}}}}
+        ])
+        for size in sizes:
+            report['orphaned_chunk_bytes'] += size['bytes']
+        report['orphaned_chunk_sets'] += len(files_ids)
+        self._sweep_files(files_ids, dry_run)
+    
+    def collect_garbage(self, grace_period_hours=24, batch_size=500, dry_run=True):
+        """Delete GridFS files no user, media item or comment references
+        
+        Only files uploaded more than grace_period_hours ago are considered,
+        so uploads whose reference hasn't been saved yet are never touched.
+        Chunks left behind by failed uploads (no fs.files document) are
+        swept under the same rule. Returns a report of reclaimable space.
+        """
+        cutoff = datetime.utcnow() - timedelta(hours=grace_period_hours)
+        report = {
+            'dry_run': dry_run,
+            'files_scanned': 0,
+            'orphaned_files': 0,
+            'orphaned_bytes': 0,
+            'orphaned_chunk_sets': 0,
+            'orphaned_chunk_bytes': 0
+        }
+        
+        referenced = self._referenced_file_ids(batch_size)
+        
+        # Sweep unreferenced files in batches
+        batch = []
+        old_files = self.db['fs.files'].find({'uploadDate': {'$lt': cutoff}}, {'length': 1})
+        for file_doc in old_files.batch_size(batch_size):
+            report['files_scanned'] += 1
+            if str(file_doc['_id']) in referenced:
+                continue
+            report['orphaned_files'] += 1
+            report['orphaned_bytes'] += file_doc.get('length', 0)
+            batch.append(file_doc['_id'])
+            if len(batch) >= batch_size:
+                self._sweep_files(batch, dry_run)
+                batch = []
+        self._sweep_files(batch, dry_run)
+        
+        # Chunks whose upload never finished; ObjectIds carry their creation time.
+        # Grouping on files_id alone is answered from the (files_id, n) index,
+        # so chunk data is only read for the orphans themselves.
+        chunk_sets = self.db['fs.chunks'].aggregate([
+            {'$match': {'files_id': {'$lt': ObjectId.from_datetime(cutoff)}}},
+            {'$sort': {'files_id': 1}},
+            {'$group': {'_id': '$files_id'}},
+            {'$lookup': {'from': 'fs.files', 'localField': '_id', 'foreignField': '_id', 'as': 'file'}},
+            {'$match': {'file': {'$size': 0}}},
+            {'$project': {'_id': 1}}
+        ], allowDiskUse=True, batchSize=batch_size)
+        batch = []
+        for chunk_set in chunk_sets:
+            batch.append(chunk_set['_id'])
+            if len(batch) >= batch_size:
+                self._sweep_orphan_chunks(batch, dry_run, report)
+                batch = []
+        self._sweep_orphan_chunks(batch, dry_run, report)
+        
+        report['reclaimable_bytes'] = report['orphaned_bytes'] + report['orphaned_chunk_bytes']
+        return report
+    
+    def _archive_collection(self, hot, archive, key_field, cutoff_id, batch_size, on_archived, only_key=None):
+        """Move documents older than cutoff_id into compressed archive documents
+        
+        on_archived(key, last_doc) is called once per key that had documents
+        archived, so readers know to look in the archive for it. only_key
+        limits the job to one conversation or file.
+        """
+        report = {'archived': 0, 'archive_documents': 0, 'raw_bytes': 0, 'packed_bytes': 0}
+        
+        if only_key is not None:
+            keys = [{'_id': only_key}]
+        else:
+            keys = hot.aggregate([
+                {'$match': {'_id': {'$lt': cutoff_id}}},
+                {'$group': {'_id': f'${key_field}'}}
+            ], allowDiskUse=True)
+        
+        for group in keys:
+            key = group['_id']
+            old_docs = hot.find({key_field: key, '_id': {'$lt': cutoff_id}}).sort('_id', 1)
+            batch = []
+            last_doc = None
+            for doc in old_docs.batch_size(batch_size):
+                batch.append(doc)
+                last_doc = doc
+                if len(batch) >= batch_size:
+                    self._archive_batch(hot, archive, key, batch, report)
+                    batch = []
+            if batch:
+                self._archive_batch(hot, archive, key, batch, report)
+            if last_doc:
+                on_archived(key, last_doc)
+        
+        return report
+    
+    def _mark_conversation_archived(self, key, last_doc):
+        """Flag both inbox entries so reads fall through to the archive"""
+        latest = self._inbox_latest(last_doc['text'], last_doc['from'], last_doc['_id'].generation_time)
+        participants = last_doc['participants']
+        self.inbox.bulk_write([
+            UpdateOne(
+                {'owner': owner, 'counterpart': counterpart},
+                [{'$set': dict(latest, unread={'$ifNull': ['$unread', 0]}, archived=True)}],
+                upsert=True
+            )
+            for owner, counterpart in {tuple(participants), tuple(reversed(participants))}
+        ], ordered=False)
+    
+    def _mark_comments_archived(self, file_ids):
+        """Flag media items so their comment reads fall through to the archive"""
+        if not file_ids:
+            return
+        self.users.update_many(
+            {'$or': [{'images.file_id': {'$in': file_ids}}, {'videos.file_id': {'$in': file_ids}}]},
+            {'$set': {'images.$[image].comments_archived': True, 'videos.$[video].comments_archived': True}},
+            array_filters=[{'image.file_id': {'$in': file_ids}}, {'video.file_id': {'$in': file_ids}}]
+        )
+    
+    def _archive_batch(self, hot, archive, key, batch, report):
+        codec, data, raw_bytes = pack_documents(batch)
+        # Insert before deleting so a crash can only duplicate, never lose, documents
+        archive.insert_one({
+            'key': key,
+            'first_id': batch[0]['_id'],
+            'last_id': batch[-1]['_id'],
+            'count': len(batch),
+            'codec': codec,
+            'raw_bytes': raw_bytes,
+            'data': Binary(data)
+        })
+        hot.delete_many({'_id': {'$in': [doc['_id'] for doc in batch]}})
+        report['archived'] += len(batch)
+        report['archive_documents'] += 1
+        report['raw_bytes'] += raw_bytes
+        report['packed_bytes'] += len(data)
+    
+    def archive_old_messages(self, older_than_days=None, batch_size=None, participants=None, file_id=None):
+        """Move chats and comments older than the given age into the archive
+        
+        Documents are grouped per conversation (chats) or per file
+        (comments), oldest first, and packed batch_size at a time. Passing
+        participants (a pair of usernames) and/or file_id archives only that
+        conversation and/or file's comments; the other collection is skipped.
+        """
+        older_than_days = Config.ARCHIVE_AFTER_DAYS if older_than_days is None else older_than_days
+        batch_size = batch_size or Config.ARCHIVE_BATCH_SIZE
+        cutoff_id = ObjectId.from_datetime(datetime.utcnow() - timedelta(days=older_than_days))
+        
+        # Chats are archived per conversation key, so older chats need one first
+        self.backfill_conversation_keys()
+        
+        filtered = participants is not None or file_id is not None
+        empty = {'archived': 0, 'archive_documents': 0, 'raw_bytes': 0, 'packed_bytes': 0}
+        report = {'chats': dict(empty), 'comments': dict(empty)}
+        
+        if participants is not None or not filtered:
+            conversation = self._conversation_key(*participants) if participants is not None else None
+            report['chats'] = self._archive_collection(
+                self.chats, self.chats_archive, 'conversation', cutoff_id,
+                batch_size, self._mark_conversation_archived, only_key=conversation)
+        
+        if file_id is not None or not filtered:
+            archived_files = []
+            report['comments'] = self._archive_collection(
+                self.comments, self.comments_archive, 'file_id', cutoff_id,
+                batch_size, lambda key, last_doc: archived_files.append(key), only_key=file_id)
+            self._mark_comments_archived(archived_files)
+        
+        return report
+    
+    def backfill_conversation_keys(self):
+        """Add the conversation key to chats and archived batches that predate it"""
+        def key_from(participants):
+            # Same format as _conversation_key(); participants are stored sorted
+            first = {'$arrayElemAt': [participants, 0]}
+            second = {'$arrayElemAt': [participants, 1]}
+            return {'$concat': [{'$toString': {'$strLenCP': first}}, ':', first, '|', second]}
+        
+        chats = self.chats.update_many(
+            {'conversation': {'$exists': False}},
+            [{'$set': {'conversation': key_from('$participants')}}]
+        )
+        batches = self.chats_archive.update_many(
+            {'key': {'$type': 'array'}},
+            [{'$set': {'key': key_from('$key')}}]
+        )
+        return chats.modified_count + batches.modified_count
+    
+    def _collection_stats(self, name):
+        try:
+            return self.db.command('collStats', name)
+        except Exception as e:
+            # Collections that don't exist yet have nothing to report
+            print(f"Error reading stats for {name}: {e}")
+            return {}
+    
+    def get_storage_stats(self):
+        """Get hot vs. archived document counts and sizes"""
+        stats = {}
+        for name, hot, archive in [('chats', self.chats, self.chats_archive),
+                                   ('comments', self.comments, self.comments_archive)]:
+            hot_stats = self._collection_stats(hot.name)
+            archive_stats = self._collection_stats(archive.name)
+            totals = list(archive.aggregate([
+                {'$group': {'_id': None, 'count': {'$sum': '$count'}, 'raw_bytes': {'$sum': '$raw_bytes'}}}
+            ]))
+            totals = totals[0] if totals else {'count': 0, 'raw_bytes': 0}
+            stats[name] = {
+                'hot_count': hot_stats.get('count', 0),
+                'hot_bytes': hot_stats.get('size', 0),
+                'hot_index_bytes': hot_stats.get('totalIndexSize', 0),
+                'archived_count': totals['count'],
+                'archived_raw_bytes': totals['raw_bytes'],
+                'archived_bytes': archive_stats.get('size', 0),
+                'archive_index_bytes': archive_stats.get('totalIndexSize', 0)
+            }
+        return stats
 
 # Global database instance
-db = Database() 
\ No newline at end of file
+db = Database()
\ No newline at end of file
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Maintenance Script - Housekeeping jobs for the Cooking Hub database
+"""
+
+import argparse
+import time
+from archive import unpack_documents
+from config import Config
+from database import db
+
+def format_bytes(size):
+    """Format a byte count for display"""
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+def run_gc(args):
+    """Remove GridFS files that nothing references"""
+    mode = "dry run" if args.dry_run else "deleting"
+    print(f"🧹 Collecting orphaned GridFS files ({mode}, grace period {args.grace_hours}h)...")
+    
+    report = db.collect_garbage(
+        grace_period_hours=args.grace_hours,
+        batch_size=args.batch_size,
+        dry_run=args.dry_run
+    )
+    
+    print(f"Files scanned: {report['files_scanned']}")
+    print(f"Orphaned files: {report['orphaned_files']} ({format_bytes(report['orphaned_bytes'])})")
+    print(f"Orphaned chunk sets: {report['orphaned_chunk_sets']} ({format_bytes(report['orphaned_chunk_bytes'])})")
+    if args.dry_run:
+        print(f"✅ Reclaimable: {format_bytes(report['reclaimable_bytes'])} (run with --delete to reclaim)")
+    else:
+        print(f"✅ Reclaimed: {format_bytes(report['reclaimable_bytes'])}")
+
+def run_rebuild_inbox(args):
+    """Backfill the chat inbox from existing messages"""
+    print("📬 Rebuilding inbox from chats...")
+    count = db.rebuild_inbox()
+    print(f"✅ Inbox has {count} conversation entries")
+
+def run_backfill_conversations(args):
+    """Add conversation keys to chats stored before they existed"""
+    print("🔑 Backfilling conversation keys...")
+    count = db.backfill_conversation_keys()
+    print(f"✅ Updated {count} documents")
+
+def run_archive(args):
+    """Move old chats and comments into compressed archive documents"""
+    print(f"🗄️  Archiving chats and comments older than {args.days} days...")
+    report = db.archive_old_messages(older_than_days=args.days, batch_size=args.batch_size)
+    
+    for name, result in report.items():
+        ratio = result['raw_bytes'] / result['packed_bytes'] if result['packed_bytes'] else 0
+        print(f"{name.capitalize()}: {result['archived']} archived into {result['archive_documents']} documents "
+              f"({format_bytes(result['raw_bytes'])} -> {format_bytes(result['packed_bytes'])}, {ratio:.1f}x)")
+    print("✅ Archiving completed!")
+
+def time_reads(read, runs):
+    """Return the median time of a read in milliseconds"""
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        read()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return timings[len(timings) // 2]
+
+def run_archive_report(args):
+    """Report hot vs. archived sizes and compare page read latency"""
+    print("📊 Storage Status:")
+    print("-" * 30)
+    
+    for name, stats in db.get_storage_stats().items():
+        print(f"{name.capitalize()}:")
+        print(f"  Hot: {stats['hot_count']} documents, {format_bytes(stats['hot_bytes'])} "
+              f"(+{format_bytes(stats['hot_index_bytes'])} indexes)")
+        print(f"  Archived: {stats['archived_count']} documents, {format_bytes(stats['archived_raw_bytes'])} "
+              f"packed into {format_bytes(stats['archived_bytes'])} "
+              f"(+{format_bytes(stats['archive_index_bytes'])} indexes)")
+    
+    # Benchmark against the conversation with the most archived messages
+    busiest = list(db.chats_archive.aggregate([
+        {'$group': {'_id': '$key', 'count': {'$sum': '$count'}, 'last_id': {'$max': '$last_id'}}},
+        {'$sort': {'count': -1}},
+        {'$limit': 1}
+    ]))
+    if not busiest:
+        print("\nNo archived chats to benchmark.")
+        return
+    
+    packed = db.chats_archive.find_one({'key': busiest[0]['_id']})
+    user1, user2 = unpack_documents(packed['codec'], packed['data'])[0]['participants']
+    oldest_hot = db.chats.find_one({'conversation': busiest[0]['_id']}, sort=[('_id', 1)])
+    # Start the archive read just past the newest archived message
+    archive_before = oldest_hot['_id'] if oldest_hot else None
+    if archive_before is None:
+        newest = db.get_chat_messages(user1, user2, limit=1)
+        archive_before = str(newest[0]['_id'])
+        print("\n(All messages in this conversation are archived)")
+    
+    page_size = Config.CHAT_PAGE_SIZE
+    hot_ms = time_reads(lambda: db.get_chat_messages(user1, user2, limit=page_size), args.runs)
+    archive_ms = time_reads(
+        lambda: db.get_chat_messages(user1, user2, before=str(archive_before), limit=page_size), args.runs)
+    
+    print(f"\n⏱️  Page of {page_size} messages, {user1} <-> {user2} (median of {args.runs} runs):")
+    print(f"  Hot window: {hot_ms:.2f} ms")
+    print(f"  Archive: {archive_ms:.2f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description="Cooking Hub maintenance jobs")
+    commands = parser.add_subparsers(dest='command', required=True)
+    
+    gc_parser = commands.add_parser('gc', help="Remove unreferenced GridFS files")
+    gc_parser.add_argument('--delete', dest='dry_run', action='store_false',
+                           help="Actually delete files (default is a dry-run report)")
+    gc_parser.add_argument('--grace-hours', type=float, default=Config.GC_GRACE_PERIOD_HOURS,
+                           help="Only collect files older than this")
+    gc_parser.add_argument('--batch-size', type=int, default=Config.GC_BATCH_SIZE)
+    gc_parser.set_defaults(func=run_gc)
+    
+    inbox_parser = commands.add_parser('rebuild-inbox', help="Backfill the chat inbox from existing messages")
+    inbox_parser.set_defaults(func=run_rebuild_inbox)
+    
+    backfill_parser = commands.add_parser('backfill-conversations',
+                                          help="Add conversation keys to chats stored before they existed")
+    backfill_parser.set_defaults(func=run_backfill_conversations)
+    
+    archive_parser = commands.add_parser('archive', help="Move old chats and comments into the archive")
+    archive_parser.add_argument('--days', type=float, default=Config.ARCHIVE_AFTER_DAYS,
+                                help="Archive documents older than this many days")
+    archive_parser.add_argument('--batch-size', type=int, default=Config.ARCHIVE_BATCH_SIZE)
+    archive_parser.set_defaults(func=run_archive)
+    
+    report_parser = commands.add_parser('archive-report',
+                                        help="Show hot vs. archived sizes and benchmark page reads")
+    report_parser.add_argument('--runs', type=int, default=20)
+    report_parser.set_defaults(func=run_archive_report)
+    
+    args = parser.parse_args()
+    
+    try:
+        args.func(args)
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        print("Please ensure MongoDB is running and accessible.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import request, session, make_response
+from pymongo import ReturnDocument
+
+
+class MemoryBucketStore:
+    """Token buckets kept in this process (one worker)
+
+    At most max_keys buckets are kept. When full, a bucket that has already
+    refilled (and so holds no state) is evicted, looking at up to
+    evict_scan of the least recently used ones. Only if none has refilled
+    is the least recently used bucket dropped, which hands that client a
+    fresh burst.
+    """
+
+    def __init__(self, max_keys=100000, evict_scan=32):
+        self.max_keys = max_keys
+        self.evict_scan = evict_scan
+        self._buckets = OrderedDict()  # key -> (tokens, updated, refilled_at), least recently used first
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, capacity):
+        """Take one token, returning (allowed, retry_after_seconds)"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated, _ = self._buckets.get(key, (capacity, now, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now, now + (capacity - tokens) / rate)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._evict(now)
+        return allowed, 0 if allowed else (1 - tokens) / rate
+
+    def _evict(self, now):
+        """Drop one bucket, preferring one that has refilled (caller holds the lock)"""
+        for i, (key, (_, _, refilled_at)) in enumerate(self._buckets.items()):
+            if refilled_at <= now:
+                del self._buckets[key]
+                return
+            if i + 1 >= self.evict_scan:
+                break
+        self._buckets.popitem(last=False)
+
+
+class MongoBucketStore:
+    """Token buckets shared by every worker through a MongoDB collection"""
+
+    def __init__(self, collection):
+        self.collection = collection
+        # Buckets expire once they would have refilled anyway
+        self.collection.create_index("expires_at", expireAfterSeconds=0)
+
+    def take(self, key, rate, capacity):
+        """Take one token atomically, returning (allowed, retry_after_seconds)"""
+        # The refill is computed server-side with $$NOW so workers on hosts
+        # with skewed clocks still agree on the bucket state
+        elapsed = {'$divide': [{'$subtract': ['$$NOW', {'$ifNull': ['$updated', '$$NOW']}]}, 1000]}
+        refilled = {'$min': [capacity, {'$add': [{'$ifNull': ['$tokens', capacity]},
+                                                  {'$multiply': [elapsed, rate]}]}]}
+        pipeline = [
+            {'$set': {'tokens': refilled, 'updated': '$$NOW'}},
+            {'$set': {'allowed': {'$gte': ['$tokens', 1]}}},
+            {'$set': {
+                'tokens': {'$cond': ['$allowed', {'$subtract': ['$tokens', 1]}, '$tokens']},
+                'expires_at': {'$add': ['$$NOW', int(capacity / rate * 1000)]}
+            }}
+        ]
+        try:
+            bucket = self.collection.find_one_and_update(
+                {'_id': key},
+                pipeline,
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except Exception as e:
+            # Fail open: a store outage should not take the site down with it
+            print(f"Error updating rate limit bucket: {e}")
+            return True, 0
+        if bucket['allowed']:
+            return True, 0
+        return False, (1 - bucket['tokens']) / rate
+
+
+class RateLimiter:
+    """Per-user, per-route token buckets plus per-route concurrency caps"""
+
+    def __init__(self, store, concurrency_retry_after=1):
+        self.store = store
+        self.concurrency_retry_after = concurrency_retry_after
+
+    def _client_key(self):
+        if 'username' in session:
+            return f"user:{session['username']}"
+        return f"ip:{request.remote_addr}"
+
+    def limit(self, route, rate, capacity, max_concurrent=None, applies=None):
+        """Decorate a view with a token bucket and an optional concurrency cap
+
+        rate is tokens per second and capacity the burst size. Requests over
+        the rate get 429, requests over max_concurrent get 503, both with a
+        Retry-After header. applies, if given, decides per request whether
+        the limits are enforced (e.g. only for POST).
+        """
+        semaphore = None
+        if max_concurrent:
+            semaphore = threading.BoundedSemaphore(max_concurrent)
+
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if applies and not applies():
+                    return view(*args, **kwargs)
+
+                # Check capacity first so a 503 doesn't also spend the client's token
+                if semaphore is not None and not semaphore.acquire(blocking=False):
+                    return self._reject("Server busy. Please try again shortly.", 503,
+                                        self.concurrency_retry_after)
+                try:
+                    allowed, retry_after = self.store.take(f"{route}:{self._client_key()}", rate, capacity)
+                    if not allowed:
+                        return self._reject("Too many requests. Please slow down.", 429, retry_after)
+                    return view(*args, **kwargs)
+                finally:
+                    if semaphore is not None:
+                        semaphore.release()
+            return wrapper
+        return decorator
+
+    def _reject(self, message, status, retry_after):
+        response = make_response(message, status)
+        response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+        return response
@@ -0,0 +1,218 @@
+import atexit
+import threading
+import time
+from pymongo import UpdateOne, DeleteOne
+
+
+class WriteBehindBuffer:
+    """Coalesce like toggles and view counts in memory and flush them in bulk.
+
+    Likes are keyed by (file_id, username) and only the final state of each
+    pair is written, so a burst of like/unlike clicks on a hot post becomes a
+    single upsert or delete. View counts are summed per file_id and written as
+    one $inc. Everything pending is flushed as one unordered bulk_write per
+    collection every `flush_interval` seconds, on shutdown, and immediately
+    once `max_pending` keys are waiting (which bounds what a crash can lose).
+
+    If a flush fails, the batch is put back up to `max_pending` keys and the
+    rest is dropped. Only the background thread retries, backing off up to
+    `max_backoff` seconds, so requests never wait on a database outage.
+    """
+
+    def __init__(self, likes, views, flush_interval=0.25, max_pending=1000, max_backoff=30):
+        self.likes = likes
+        self.views = views
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.max_backoff = max_backoff
+        self._failures = 0  # consecutive failed flushes
+
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending_likes = {}   # (file_id, username) -> True (liked) / False (unliked)
+        self._pending_views = {}   # file_id -> count
+        # The batch currently being written; it still counts until the write lands
+        self._inflight_likes = {}
+        self._inflight_views = {}
+
+        self._stats = {
+            'flushes': 0,
+            'likes_written': 0,
+            'views_written': 0,
+            'last_batch_size': 0,
+            'max_batch_size': 0,
+            'last_flush_ms': 0.0,
+            'max_flush_ms': 0.0,
+            'total_flush_ms': 0.0,
+            'errors': 0,
+            'dropped': 0
+        }
+
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='write-behind-flush', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _run(self):
+        while not self._stop.wait(self._next_wait()):
+            self.flush()
+
+    def _next_wait(self):
+        if not self._failures:
+            return self.flush_interval
+        return min(self.max_backoff, self.flush_interval * 2 ** self._failures)
+
+    def _pending_count(self):
+        return len(self._pending_likes) + len(self._pending_views)
+
+    def _is_full(self):
+        """Whether pending keys have hit max_pending (caller holds the lock)"""
+        return self._pending_count() >= self.max_pending
+
+    def toggle_like(self, file_id, username):
+        """Toggle a like, returning the new state (True = liked)"""
+        key = (file_id, username)
+        with self._lock:
+            liked = self._buffered_like(key)
+        if liked is None:
+            # Nothing pending or in flight for this pair, so the stored state is current
+            liked = self.likes.find_one({'file_id': file_id, 'username': username}) is not None
+
+        with self._lock:
+            # Another toggle may have landed while we were reading
+            buffered = self._buffered_like(key)
+            liked = liked if buffered is None else buffered
+            if self._failures and key not in self._pending_likes and self._is_full():
+                # The database is down and the buffer is full; the click is lost
+                self._stats['dropped'] += 1
+                return liked
+            self._pending_likes[key] = not liked
+            # Flush inline only while flushes are succeeding; after a failure
+            # the background thread retries with backoff
+            flush_now = self._is_full() and not self._failures
+        if flush_now:
+            self.flush()
+        return not liked
+
+    def _buffered_like(self, key):
+        """Latest unwritten state for a pair, or None (caller holds the lock)"""
+        if key in self._pending_likes:
+            return self._pending_likes[key]
+        return self._inflight_likes.get(key)
+
+    def record_view(self, file_id, count=1):
+        """Add to the pending view count for a file"""
+        with self._lock:
+            if self._failures and file_id not in self._pending_views and self._is_full():
+                self._stats['dropped'] += count
+                return
+            self._pending_views[file_id] = self._pending_views.get(file_id, 0) + count
+            flush_now = self._is_full() and not self._failures
+        if flush_now:
+            self.flush()
+
+    def pending_likes_for_file(self, file_id):
+        """Return {username: liked} for changes not yet written for a file"""
+        with self._lock:
+            changes = {}
+            for likes in (self._inflight_likes, self._pending_likes):
+                changes.update({username: liked for (fid, username), liked in likes.items()
+                                if fid == file_id})
+            return changes
+
+    def pending_views_for_file(self, file_id):
+        with self._lock:
+            return self._inflight_views.get(file_id, 0) + self._pending_views.get(file_id, 0)
+
+    def flush(self):
+        """Write everything pending as unordered bulk writes"""
+        with self._flush_lock:
+            with self._lock:
+                pending_likes, self._pending_likes = self._pending_likes, {}
+                pending_views, self._pending_views = self._pending_views, {}
+                self._inflight_likes = pending_likes
+                self._inflight_views = pending_views
+
+            if not pending_likes and not pending_views:
+                return 0
+
+            like_ops = []
+            for (file_id, username), liked in pending_likes.items():
+                doc = {'file_id': file_id, 'username': username}
+                if liked:
+                    like_ops.append(UpdateOne(doc, {'$setOnInsert': doc}, upsert=True))
+                else:
+                    like_ops.append(DeleteOne(doc))
+
+            view_ops = [
+                UpdateOne({'file_id': file_id}, {'$inc': {'count': count}}, upsert=True)
+                for file_id, count in pending_views.items()
+            ]
+
+            start = time.perf_counter()
+            try:
+                if like_ops:
+                    self.likes.bulk_write(like_ops, ordered=False)
+                if view_ops:
+                    self.views.bulk_write(view_ops, ordered=False)
+            except Exception as e:
+                print(f"Error flushing write-behind buffer: {e}")
+                self._stats['errors'] += 1
+                self._failures += 1
+                self._requeue(pending_likes, pending_views)
+                return 0
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            self._failures = 0
+
+            with self._lock:
+                self._inflight_likes = {}
+                self._inflight_views = {}
+
+            batch_size = len(like_ops) + len(view_ops)
+            self._stats['flushes'] += 1
+            self._stats['likes_written'] += len(like_ops)
+            self._stats['views_written'] += len(view_ops)
+            self._stats['last_batch_size'] = batch_size
+            self._stats['max_batch_size'] = max(self._stats['max_batch_size'], batch_size)
+            self._stats['last_flush_ms'] = elapsed_ms
+            self._stats['max_flush_ms'] = max(self._stats['max_flush_ms'], elapsed_ms)
+            self._stats['total_flush_ms'] += elapsed_ms
+            return batch_size
+
+    def _requeue(self, pending_likes, pending_views):
+        """Put a failed batch back, up to max_pending keys, without clobbering newer changes"""
+        # Like ops are idempotent; a partially applied view batch may be counted twice
+        with self._lock:
+            self._inflight_likes = {}
+            self._inflight_views = {}
+            for key, liked in pending_likes.items():
+                if key in self._pending_likes:
+                    continue
+                if self._is_full():
+                    self._stats['dropped'] += 1
+                else:
+                    self._pending_likes[key] = liked
+            for file_id, count in pending_views.items():
+                if file_id in self._pending_views:
+                    self._pending_views[file_id] += count
+                elif self._is_full():
+                    self._stats['dropped'] += count
+                else:
+                    self._pending_views[file_id] = count
+
+    def stats(self):
+        """Return batch size and flush latency counters"""
+        stats = dict(self._stats)
+        stats['avg_flush_ms'] = stats['total_flush_ms'] / stats['flushes'] if stats['flushes'] else 0.0
+        with self._lock:
+            stats['pending'] = self._pending_count()
+            stats['in_flight'] = len(self._inflight_likes) + len(self._inflight_views)
+        stats['consecutive_failures'] = self._failures
+        return stats
+
+    def close(self):
+        """Stop the background thread and flush what is left"""
+        self._stop.set()
+        if self._thread.is_alive() and self._thread is not threading.current_thread():
+            self._thread.join(timeout=self.flush_interval * 2)
+        self.flush()